@@ -1,25 +1,353 @@
 #!/usr/bin/env python3
-import os, re, sys, json, time, shlex, shutil, argparse, subprocess
-from urllib.parse import urljoin
+import os, re, sys, json, time, array, queue, shutil, argparse, tempfile, subprocess
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+# optional, speeds up writing the manifest
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 DEFAULT_SOURCE_PATH = 'source'
 DEFAULT_OUTPUT_PATH = 'out'
 DEFAULT_IMAGEMAGICK_PATH = 'magick'
 DEFAULT_BASE_URL = 'http://localhost/'
+DEFAULT_JOBS = os.cpu_count() or 1
 
 IMAGE_FILENAME_MAGIC_CONSTANT = '$$KR_'
 IMAGE_SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.avif', '.tif', '.tiff', '.tga')
 IMAGE_OUTPUT_FORMAT = 'webp'
 IMAGE_OUTPUT_MAX_RES = 512
 IMAGE_OUTPUT_QUALITY = 85
+IMAGE_MAGICK_BATCH_SIZE = 32 # max images per `magick` invocation
+IMAGE_MAGICK_WORKER_START_TIMEOUT = 10 # seconds to wait for a `magick -script` worker to respond
 IMAGE_MAGICK_COMMAND = [
     f'-resize',f'{IMAGE_OUTPUT_MAX_RES}x{IMAGE_OUTPUT_MAX_RES}>',
     f'-quality',f'{IMAGE_OUTPUT_QUALITY}',
 ]
 
-# Fix for Windows systems, adds a caret before `>` characters to escape it.
-if sys.platform == "win32":
-    IMAGE_MAGICK_COMMAND = [a.replace('>', '^>') for a in IMAGE_MAGICK_COMMAND]
+# terminal colors for log output
+ANSI_RED = '\033[91m'
+ANSI_GREEN = '\033[92m'
+ANSI_CYAN = '\033[96m'
+ANSI_RESET = '\033[0m'
+LOG_ERROR = f'{ANSI_RED}[ERROR]{ANSI_RESET}'
+LOG_OK = f'{ANSI_GREEN}[OK]{ANSI_RESET}'
+LOG_BUFFER_LINES = 256 # per-image log lines to collect before writing them out
+
+# category folders are named 'XX - Category Name'. this only matches the
+# 'XX - ' prefix, so the end of the match is where the name starts.
+_CAT_RE = re.compile(r'^\d{2}\s*-\s*(?=\w)')
+
+# Note: ImageMagick is always run with an argument list and `shell=False`, so no
+# shell quoting or escaping (e.g. `^>` on Windows) is needed for these arguments.
+
+class MagickWorker:
+    """
+    A long-running `magick -script -` process that reads resize commands from stdin,
+    so ImageMagick only has to start up once per worker instead of once per batch.
+
+    After each image the script writes a tiny sentinel image into a private temp
+    folder. The script runs its commands in order, so once the sentinel file shows
+    up, the image before it has been written. This doesn't rely on ImageMagick
+    flushing anything to a pipe. stderr goes to a temporary file instead of a pipe,
+    so a chatty ImageMagick can never block on a full pipe either.
+
+    This needs ImageMagick 7's `-script` option. `start()` returns False if the
+    worker exits or doesn't respond (e.g. when using `convert` from ImageMagick 6).
+    """
+
+    def __init__(self, magick_path, magick_env=None):
+        self.magick_path = magick_path
+        self.magick_env = magick_env
+        self.proc = None
+        self.stderr_file = None
+        self.sentinel_dir = None
+        self.sentinel_count = 0
+        self.dead = False # set once the process has exited
+
+    def start(self):
+        self.dead = False
+        self.stderr_file = tempfile.TemporaryFile(buffering=0)
+        self.sentinel_dir = tempfile.mkdtemp(prefix='kr-magick-')
+        if not self.script_safe(self.sentinel_dir):
+            self.close()
+            return False
+        try:
+            self.proc = subprocess.Popen(
+                [self.magick_path, '-script', '-'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=self.stderr_file,
+                env=self.magick_env,
+                text=True,
+                encoding='utf-8',
+                errors='surrogateescape'
+            )
+        except OSError:
+            self.close()
+            return False
+
+        if not self._sync(timeout=IMAGE_MAGICK_WORKER_START_TIMEOUT):
+            self.close()
+            return False
+        return True
+
+    def resize(self, src, dst):
+        """
+        Resizes a single image. The paths must be safe to put in a script (see
+        `script_safe`). Returns a tuple of (ok, stderr).
+        """
+        if self.proc is None and not self.start():
+            return (False, "Failed to start ImageMagick worker process.")
+
+        # ImageMagick keeps going after a failed read/write in script mode, so the
+        # only way to tell whether this image worked is to check for the output.
+        try:
+            os.remove(dst)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            return (False, str(e))
+
+        stderr_pos = self.stderr_file.tell()
+        try:
+            args = ' '.join(f"'{a}'" for a in IMAGE_MAGICK_COMMAND)
+            # `-delete 0--1` clears the whole image list. `+delete` would only drop the
+            # last frame, leaving the rest of a multi-frame source for the next image.
+            self.proc.stdin.write(f"-read '{src}' {args} -write '{dst}' -delete 0--1\n")
+        except OSError:
+            pass # the process died, `_sync` will notice
+
+        synced = self._sync()
+        ok = synced and os.path.isfile(dst)
+
+        stderr = ''
+        if not ok:
+            _remove_output(dst)
+            self.stderr_file.seek(stderr_pos)
+            stderr = self.stderr_file.read().decode('utf-8', 'replace')
+
+        # if the sentinel never showed up, the process is gone; restart it on the
+        # next image.
+        if not synced:
+            self.close()
+
+        return (ok, stderr)
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close() # EOF ends the script
+            except OSError:
+                pass
+            try:
+                self.proc.wait(timeout=IMAGE_MAGICK_WORKER_START_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+        if self.stderr_file is not None:
+            self.stderr_file.close()
+            self.stderr_file = None
+        if self.sentinel_dir is not None:
+            shutil.rmtree(self.sentinel_dir, ignore_errors=True)
+            self.sentinel_dir = None
+
+    @staticmethod
+    def script_safe(path):
+        # paths are single-quoted in the script, which has no way to escape quotes.
+        # they also have to survive the trip through the UTF-8 pipe; undecodable
+        # filename bytes come back out via `surrogateescape`, anything else doesn't.
+        if "'" in path or "\n" in path:
+            return False
+        try:
+            path.encode('utf-8', 'surrogateescape')
+        except UnicodeEncodeError:
+            return False
+        return True
+
+    def _sync(self, timeout=None):
+        # have the script write a sentinel image and wait until it exists. returns
+        # False if the process exited or didn't get there in time. the exit check
+        # runs on every poll, so a dying process is never waited on forever.
+        if self.dead:
+            return False
+        self.sentinel_count += 1
+        sentinel = f"{self.sentinel_dir}{os.sep}{self.sentinel_count}.gif"
+        try:
+            self.proc.stdin.write(f"xc:none -write '{sentinel}' -delete 0--1\n")
+            self.proc.stdin.flush()
+        except OSError:
+            pass # the process died, the loop below will notice
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.001
+        while not os.path.exists(sentinel):
+            if self.proc.poll() is not None:
+                self.dead = True
+                return False
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+        # the previous sentinel was certainly closed before this one got created
+        try:
+            os.remove(f"{self.sentinel_dir}{os.sep}{self.sentinel_count - 1}.gif")
+        except OSError:
+            pass
+        return True
+
+def _start_magick_workers(magick_path, magick_env, count):
+    """
+    Starts `count` MagickWorkers and returns them in a queue, so pool threads can
+    borrow one at a time. Returns None if the workers aren't supported.
+    """
+    workers = queue.Queue()
+    for _ in range(count):
+        worker = MagickWorker(magick_path, magick_env)
+        if not worker.start():
+            _close_magick_workers(workers)
+            return None
+        workers.put(worker)
+    return workers
+
+def _close_magick_workers(workers):
+    while not workers.empty():
+        workers.get().close()
+
+def _json_dumps(value):
+    """
+    Encodes `value` as compact UTF-8 JSON bytes. Uses `orjson` if it's installed,
+    since it's a lot faster than the `json` module for big manifests.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _write_manifest(f, manifest, url_file, attributes):
+    """
+    Writes the manifest as compact JSON to the binary file `f`. The `urls` array is
+    streamed from `url_file`, which has one JSON-encoded URL per line, instead of
+    being held in memory as a list. `attributes` is an `array.array('B')`.
+    """
+    f.write(b'{"version":' + _json_dumps(manifest["version"]) + b',"pool":{')
+    for key, value in manifest["pool"].items():
+        f.write(_json_dumps(key) + b':' + _json_dumps(value) + b',')
+
+    f.write(b'"urls":[')
+    url_file.seek(0)
+    for k, line in enumerate(url_file):
+        if k > 0:
+            f.write(b',')
+        f.write(line.rstrip(b'\n'))
+    f.write(b'],"attributes":[')
+    for k in range(0, len(attributes), 65536):
+        if k > 0:
+            f.write(b',')
+        f.write(b','.join(b'%d' % a for a in attributes[k:k + 65536]))
+    f.write(b']}}')
+
+def _flush_log(log_buf):
+    # write all buffered log lines with a single call, instead of one per print
+    if log_buf:
+        sys.stdout.write('\n'.join(log_buf) + '\n')
+        sys.stdout.flush()
+        log_buf.clear()
+
+def _is_up_to_date(src_entry, out_path):
+    # an output image is up to date if it's at least as new as its source
+    try:
+        return os.stat(out_path).st_mtime >= src_entry.stat().st_mtime
+    except OSError:
+        return False
+
+def _remove_output(out_path):
+    # remove the output of a failed encode, if there is any
+    try:
+        os.remove(out_path)
+    except OSError:
+        pass
+
+def _resize_one(magick_path, magick_env, job):
+    """
+    Runs ImageMagick for a single image job. This is called from the worker pool,
+    so it must not print anything; the caller logs the results in order.
+
+    Returns a tuple of (ok, img_url, img_attrib, stderr).
+    """
+    _j, _src_image, src_image_path, out_image_path, img_url, img_attrib = job
+
+    cmd = [magick_path, src_image_path, *IMAGE_MAGICK_COMMAND, out_image_path]
+
+    # ImageMagick prints nothing useful on stdout, and stderr is only needed when
+    # something went wrong, so don't bother decoding it otherwise
+    result = subprocess.run(
+        cmd,
+        shell=False,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=magick_env
+    )
+
+    if result.returncode != 0:
+        # a failed encode can leave a truncated output behind, which would look
+        # up to date on the next run (see `_is_up_to_date`)
+        _remove_output(out_image_path)
+        return (False, img_url, img_attrib, result.stderr.decode('utf-8', 'replace'))
+    return (True, img_url, img_attrib, '')
+
+def _resize_batch(magick_path, magick_env, magick_workers, batch):
+    """
+    Runs ImageMagick once for a whole batch of image jobs, so the process startup
+    cost is paid once per batch instead of once per image. Every image gets its own
+    `( src ... -write dst +delete )` sequence, and the final image list is discarded.
+
+    If the batch fails, its images are retried one at a time so that the error is
+    reported for the image(s) that actually caused it.
+
+    If `magick_workers` is given, the images are sent to a MagickWorker instead and
+    no new processes are started at all.
+
+    Returns a list of (ok, img_url, img_attrib, stderr) tuples, in job order.
+    """
+    if magick_workers is not None:
+        worker = magick_workers.get()
+        try:
+            results = []
+            for job in batch:
+                _j, _src_image, src_image_path, out_image_path, img_url, img_attrib = job
+                if not (MagickWorker.script_safe(src_image_path) and MagickWorker.script_safe(out_image_path)):
+                    results.append(_resize_one(magick_path, magick_env, job))
+                    continue
+                ok, stderr = worker.resize(src_image_path, out_image_path)
+                results.append((ok, img_url, img_attrib, stderr))
+            return results
+        finally:
+            magick_workers.put(worker)
+
+    if len(batch) == 1:
+        return [_resize_one(magick_path, magick_env, batch[0])]
+
+    cmd = [magick_path]
+    for _j, _src_image, src_image_path, out_image_path, _img_url, _img_attrib in batch:
+        cmd += ['(', src_image_path, *IMAGE_MAGICK_COMMAND, '-write', out_image_path, '+delete', ')']
+    cmd.append('null:')
+
+    result = subprocess.run(
+        cmd,
+        shell=False,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=magick_env
+    )
+
+    if result.returncode != 0:
+        return [_resize_one(magick_path, magick_env, job) for job in batch]
+
+    return [(True, img_url, img_attrib, '') for *_, img_url, img_attrib in batch]
 
 def main():
     parser = argparse.ArgumentParser(description="Compile image pool for distribution")
@@ -27,13 +355,24 @@ def main():
     parser.add_argument('--output-path', type=str, default=DEFAULT_OUTPUT_PATH, help='Path to the output directory (default: "out")')
     parser.add_argument('--base-url', type=str, default=DEFAULT_BASE_URL, help='Base URL (default: "http://localhost/")')
     parser.add_argument('--magick', type=str, default=DEFAULT_IMAGEMAGICK_PATH, help='Direct path for ImageMagick\'s `magick` executable (default: tries global "magick")')
+    parser.add_argument('--verbose', action='store_true', help='Log every processed image, not just the ones that failed')
+    parser.add_argument('--force', action='store_true', help='Process all images, even if their output is already up to date')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help=f'Number of images to process in parallel (default: CPU count, {DEFAULT_JOBS})')
     args = parser.parse_args()
 
     # we've parsed the arguments. time to set up the rest
     src_path = args.source_path
     output_path = args.output_path
     base_url = args.base_url
+
+    # image URLs are built by appending their relative path to the base URL, so
+    # it has to end with a slash
+    if not base_url.endswith('/'):
+        base_url += '/'
     magick_path = args.magick
+    jobs = max(1, args.jobs)
+    force = args.force
+    verbose = args.verbose
 
     # check if imagemagick exists
     if shutil.which(magick_path) is None:
@@ -42,19 +381,37 @@ def main():
         print("Note: If you're on Linux/Unix, try setting `--magick=convert` instead.")
         sys.exit(1)
 
+    # ImageMagick uses all CPU cores for every image by default. when we're already
+    # running several images in parallel, that just makes the processes fight over
+    # the cores, so limit each one to a single thread. with `--jobs 1` (e.g. for a
+    # few very large images), ImageMagick keeps doing its own multithreading.
+    magick_env = None
+    if jobs > 1:
+        magick_env = {**os.environ, 'MAGICK_THREAD_LIMIT': '1', 'OMP_NUM_THREADS': '1'}
+
+    # try to start one long-running ImageMagick process per job. if that's not
+    # supported, we fall back to running `magick` once per batch.
+    magick_workers = _start_magick_workers(magick_path, magick_env, jobs)
+    if magick_workers is None:
+        print("Note: ImageMagick `-script` mode unavailable, running `magick` once per batch.")
+
     manifest_version = int(time.time())
 
-    # intialize base object for the manifest
+    # intialize base object for the manifest. the `urls` array can get huge, so it
+    # is written to a side file as we go instead, and then streamed into the
+    # manifest at the very end (see `_write_manifest`). attributes only take up
+    # one byte each in an array, so they can just stay in memory.
     manifest = {
         "version": int(manifest_version),
         "pool": {
             "base_url": str(base_url),
             "categories": [],
             "total_length": 0,
-            "urls": [],
-            "attributes": [],
         }
     }
+    url_file = tempfile.TemporaryFile() # one JSON string per line
+    attributes = array.array('B')
+    url_count = 0
 
     # check if the output path exists, if not create it
     if not os.path.exists(output_path):
@@ -62,73 +419,93 @@ def main():
 
     # Get all category folders. We do some pattern matching to only get folders
     # that match the naming convention of 'XX - Category Name'
-    category_folders = [
-        folder for folder in os.listdir(src_path)
-        if os.path.isdir(os.path.join(src_path, folder)) and re.match(r'^\d{2}\s*-\s*\w+', folder)
-    ]
+    # `os.scandir` caches the file type of each entry, so this doesn't need an extra
+    # `stat` call per entry like `os.listdir` + `os.path.isdir` does.
+    with os.scandir(src_path) as it:
+        category_folders = [
+            entry.name for entry in it
+            if entry.is_dir() and _CAT_RE.match(entry.name)
+        ]
     category_folders.sort() # sort by first digits
 
     # process each category
     cumulative_length = 0 # cumulative for all items across all categories
+    category_count = len(category_folders)
     for i, category_folder in enumerate(category_folders):
         category_start_index = cumulative_length
         category_length = 0
 
         src_category_path = os.path.join(src_path, category_folder)
 
-        # split the category folder name: "XX - Category Name"
-        _split = category_folder.split(' - ', 1)
-        category_number = int(_split[0])
-        category_name = str(_split[1])
+        # split the category folder name: "XX - Category Name". it already matched
+        # `_CAT_RE`, so the first two characters are always the category number.
+        # the name is everything after the first ' - ', exactly as-is; folders
+        # without one (e.g. "XX-Name") use the end of the regex match instead.
+        category_number = int(category_folder[:2])
+        _sep = category_folder.find(' - ')
+        if _sep >= 0:
+            category_name = category_folder[_sep + 3:]
+        else:
+            category_name = category_folder[_CAT_RE.match(category_folder).end():]
 
         out_category_path = os.path.join(output_path, f"{category_number:02x}")
 
-        print("\033[96m" + 
-            f"Processing category {i + 1} of {len(category_folders)}: " +
-            f"[{category_number:02d}] {category_name}" +
-            "\033[0m")
+        print(f"{ANSI_CYAN}Processing category {i + 1} of {category_count}: [{category_number:02d}] {category_name}{ANSI_RESET}")
 
         # create output category folder
         try:
             os.makedirs(out_category_path, exist_ok=True)
         except Exception as e:
-            print("\033[91m[ERROR]\033[0m", end=' ')
+            print(LOG_ERROR, end=' ')
             print("Failed to create output category folder. Skipping.")
             print(f"'{out_category_path}': {e}")
             continue
 
-        src_image_files = [
-            f for f in os.listdir(src_category_path)
-            if f.startswith(IMAGE_FILENAME_MAGIC_CONSTANT)
-                and f.lower().endswith(IMAGE_SUPPORTED_FORMATS)
-                and os.path.isfile(os.path.join(src_category_path, f))
-        ]
-
-        # process each image in the category
-        for j, src_image in enumerate(src_image_files):
+        with os.scandir(src_category_path) as it:
+            src_image_entries = [
+                entry for entry in it
+                if entry.name.startswith(IMAGE_FILENAME_MAGIC_CONSTANT)
+                    and entry.name.lower().endswith(IMAGE_SUPPORTED_FORMATS)
+                    and entry.is_file()
+            ]
+
+        # validate each image in the category and queue it up for processing
+        image_jobs = []
+        magick_jobs = [] # the subset of `image_jobs` that actually needs ImageMagick
+        up_to_date_jobs = set()
+        created_dirs = set() # output image directories that already exist
+        for j, src_image_entry in enumerate(src_image_entries):
             if j >= 65536:
-                print("\033[91m[ERROR]\033[0m", end=" ")
+                print(LOG_ERROR, end=' ')
                 print("Max images per category reached (65536)! Finishing category.")
                 break
 
-            # remove file extension, then tokenize by underscore
-            _parts = src_image.split('.')[0].split('_')
+            src_image = src_image_entry.name
 
-            img_cat = int(_parts[1], 16) # hex string -> dec integer
-            img_id = str(_parts[2])
-            img_attrib = int(_parts[3], 16) # hex string -> dec integer
+            # remove magic constant and file extension, then tokenize by underscore.
+            # we only need the first three tokens, so stop splitting after those.
+            _stem = src_image[len(IMAGE_FILENAME_MAGIC_CONSTANT):].partition('.')[0]
+            _parts = _stem.split('_', 3)
+
+            img_cat = img_id = img_attrib = None
+            try:
+                img_cat = int(_parts[0], 16) # hex string -> dec integer
+                img_id = str(_parts[1])
+                img_attrib = int(_parts[2], 16) # hex string -> dec integer
+            except (IndexError, ValueError):
+                pass
 
             # sanity checks. if these fail, skip this item!
             # check if any tokens are missing
             if img_cat is None or img_id is None or img_attrib is None:
-                print("\033[91m[ERROR]\033[0m", end=' ')
+                print(LOG_ERROR, end=' ')
                 print("One or more tokens are empty or invalid! Skipping.")
                 print(f"  img: {src_image}, cat: {img_cat}, id: {img_id}, attrib: {img_attrib}")
                 continue
 
             # Check if category number matches
             if img_cat != category_number:
-                print("\033[91m[ERROR]\033[0m", end=' ')
+                print(LOG_ERROR, end=' ')
                 print("Category mismatch! Skipping.")
                 print(f"  cat: {category_number}, img: {src_image}, img cat: {img_cat}")
                 continue
@@ -138,21 +515,23 @@ def main():
             # since these values *could* change in the future. We just need them to be at
             # *least* 4 characters long, otherwise the output folder structure could break.
             if len(img_id) < 4:
-                print("\033[91m[ERROR]\033[0m", end=' ')
+                print(LOG_ERROR, end=' ')
                 print("Invalid image ID! Must be at least 4 characters. Skipping.")
                 print(f"  img: {src_image}, id: {img_id}")
                 continue
 
-            # Check if image ID is alphanumeric (a-z, A-Z, 0-9)
-            if not re.fullmatch(r'[a-zA-Z0-9]+', img_id):
-                print("\033[91m[ERROR]\033[0m", end=' ')
+            # Check if image ID is alphanumeric (a-z, A-Z, 0-9).
+            # `isalnum` alone would also accept non-ASCII letters and digits.
+            if not (img_id.isascii() and img_id.isalnum()):
+                print(LOG_ERROR, end=' ')
                 print("Invalid image ID! Must be alphanumeric (a-z, A-Z, 0-9). Skipping.")
                 print(f"  img: {src_image}, id: {img_id}")
                 continue
 
-            # Check if _src_attrib is a valid 8-bit unsigned integer
-            if not (0 <= img_attrib <= 255):
-                print("\033[91m[ERROR]\033[0m", end=' ')
+            # Check if _src_attrib is a valid 8-bit unsigned integer. any bits set
+            # outside the low byte (this includes negative numbers) make it invalid.
+            if img_attrib & ~0xFF:
+                print(LOG_ERROR, end=' ')
                 print(f"Invalid attribute flags! Must be a valid 8-bit uint (0->255). Skipping.")
                 print(f"  img: {src_image}, attrib: {img_attrib}")
                 continue
@@ -161,43 +540,79 @@ def main():
             _out_subfolder = str(img_id[:2])
             _out_file = str(img_id[2:]) + "." + IMAGE_OUTPUT_FORMAT
 
-            src_image_path = os.path.join(src_category_path, src_image)
-            out_image_dir = os.path.join(out_category_path, _out_subfolder)
-            out_image_path = os.path.join(out_image_dir, _out_file)
-
-            # try to create the output image directory
-            try:
-                os.makedirs(out_image_dir, exist_ok=True)
-            except Exception as e:
-                print("\033[91m[ERROR]\033[0m", end=' ')
-                print(f"Failed to create output image directory '{out_image_dir}': {e}")
-                continue
+            src_image_path = src_image_entry.path
+            # `out_category_path` never ends with a separator, so there's no need for
+            # the extra work `os.path.join` does for every image
+            out_image_dir = f"{out_category_path}{os.sep}{_out_subfolder}"
+            out_image_path = f"{out_image_dir}{os.sep}{_out_file}"
+
+            # try to create the output image directory. there are at most 256 of
+            # these per category, so only hit the filesystem once for each of them.
+            if out_image_dir not in created_dirs:
+                try:
+                    os.makedirs(out_image_dir, exist_ok=True)
+                except Exception as e:
+                    print(LOG_ERROR, end=' ')
+                    print(f"Failed to create output image directory '{out_image_dir}': {e}")
+                    continue
+                created_dirs.add(out_image_dir)
+
+            img_url = f"{base_url}{category_number:02x}/{_out_subfolder}/{_out_file}"
+
+            job = (j, src_image, src_image_path, out_image_path, img_url, img_attrib)
+            image_jobs.append(job)
+
+            # skip images that were already processed in a previous run
+            if not force and _is_up_to_date(src_image_entry, out_image_path):
+                up_to_date_jobs.add(j)
+            else:
+                magick_jobs.append(job)
+
+        # split the jobs into batches, but keep them small enough that every worker
+        # still gets something to do on small categories.
+        batch_size = max(1, min(IMAGE_MAGICK_BATCH_SIZE, -(-len(magick_jobs) // jobs)))
+        batches = [magick_jobs[k:k + batch_size] for k in range(0, len(magick_jobs), batch_size)]
+
+        # run ImageMagick for all batches in the category in parallel. `map` hands
+        # the results back lazily in submission order, so the manifest order is
+        # unchanged and progress gets logged while later batches are still running.
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = (
+                result
+                for batch_results in executor.map(partial(_resize_batch, magick_path, magick_env, magick_workers), batches)
+                for result in batch_results
+            )
 
-            print(f"[{i}:{j}] {src_image} -> {out_image_path}", end="\t")
+            # per-image results are buffered and written out in chunks. successful images
+            # are only logged with `--verbose`, failures are always logged.
+            log_buf = []
+            for job in image_jobs:
+                j, src_image, _src_image_path, out_image_path, img_url, img_attrib = job
 
-            cmd = [magick_path, src_image_path, *IMAGE_MAGICK_COMMAND, out_image_path]
+                if len(log_buf) >= LOG_BUFFER_LINES:
+                    _flush_log(log_buf)
 
-            result = subprocess.run(
-                cmd,
-                shell=False,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+                if j in up_to_date_jobs:
+                    ok, stderr = True, ''
+                else:
+                    ok, img_url, img_attrib, stderr = next(results)
 
-            if result.returncode != 0:
-                print("\033[91m[ERROR]\033[0m")
-                print("Image processing command failed!")
-                print(f"  error: {result.stderr}")
-                continue
+                if not ok:
+                    log_buf.append(f"[{i}:{j}] {src_image} -> {out_image_path}\t{LOG_ERROR}")
+                    log_buf.append("Image processing command failed!")
+                    log_buf.append(f"  error: {stderr}")
+                    continue
 
-            img_url = urljoin(base_url, os.path.relpath(out_image_path, output_path))
+                if verbose:
+                    _status = f"{LOG_OK} (up to date)" if j in up_to_date_jobs else LOG_OK
+                    log_buf.append(f"[{i}:{j}] {src_image} -> {out_image_path}\t{_status}")
 
-            print("\033[92m[OK]\033[0m")
-            manifest["pool"]["urls"].append(img_url)
-            manifest["pool"]["attributes"].append(img_attrib)
+                url_file.write(_json_dumps(img_url) + b'\n')
+                attributes.append(img_attrib)
+                url_count += 1
 
-            category_length += 1
+                category_length += 1
+        _flush_log(log_buf)
         cumulative_length += category_length
 
         # add category metadata object
@@ -207,10 +622,10 @@ def main():
             "length": int(category_length)
         })
 
-        print("\033[92m" + 
-            f"Finished processing category! " +
-            f"{category_length} images inside category [{category_number:02d}] {category_name}" + 
-            "\033[0m\n")
+        print(f"{ANSI_GREEN}Finished processing category! {category_length} images inside category [{category_number:02d}] {category_name}{ANSI_RESET}\n")
+
+    if magick_workers is not None:
+        _close_magick_workers(magick_workers)
 
     # add total length of items to manifest
     manifest["pool"]["total_length"] = int(cumulative_length)
@@ -218,19 +633,21 @@ def main():
     fail = False
 
     # final sanity checks
-    if len(manifest["pool"]["urls"]) != int(manifest["pool"]["total_length"]):
-        print("\033[91m[ERROR]\033[0m Mismatch between total length and number of URLs in manifest!")
-        print(f"  total_length: {manifest['pool']['total_length']}, urls: {len(manifest['pool']['urls'])}")
+    if url_count != int(manifest["pool"]["total_length"]):
+        print(f"{LOG_ERROR} Mismatch between total length and number of URLs in manifest!")
+        print(f"  total_length: {manifest['pool']['total_length']}, urls: {url_count}")
         fail = True
 
-    if len(manifest["pool"]["urls"]) != len(manifest["pool"]["attributes"]):
-        print("\033[91m[ERROR]\033[0m Mismatch between number of attributes and number of URLs in manifest!")
-        print(f"  urls: {len(manifest['pool']['urls'])}, attributes: {len(manifest['pool']['attributes'])}")
+    if url_count != len(attributes):
+        print(f"{LOG_ERROR} Mismatch between number of attributes and number of URLs in manifest!")
+        print(f"  urls: {url_count}, attributes: {len(attributes)}")
         fail = True
 
     # write metadata manifest file
-    with open(os.path.join(output_path, 'meta.json'), 'w', encoding='utf-8') as f:
-        json.dump(manifest, f, ensure_ascii=False)
+    with open(os.path.join(output_path, 'meta.json'), 'wb') as f:
+        _write_manifest(f, manifest, url_file, attributes)
+
+    url_file.close()
 
     if fail:
         print("Image pool compiled, but there were some errors (see above).")